@@ -8,6 +8,7 @@ import os
 from sys import stderr, stdout, stdin
 
 import bridge
+import staged
 
 def main(argv):
     parser = argparse.ArgumentParser(description='Reformat code, maintain blame.',
@@ -20,6 +21,9 @@ def main(argv):
     h = 'characters to ignore when comparing lines; '
     h += 'include those characters that the formatter might change [default: " \\t\\r\\n"]'
     parser.add_argument('--ignore', '-i', default=' \t\r\n', help=h)
+    h = 'reformat and blame the staged content of files rather than the working tree; '
+    h += 'the formatter must read from stdin and write to stdout'
+    parser.add_argument('--staged', '-s', action='store_true', help=h)
     parser.add_argument('--verbose', '-v', action='count')
     args = parser.parse_args(argv)
 
@@ -42,6 +46,12 @@ def main(argv):
                 stderr.write('can only specify {output} once')
                 exit(2)
 
+    if args.staged:
+        if inputIdx is not None or outputIdx is not None:
+            stderr.write('error: can\'t use {input} or {output} with --staged\n')
+            exit(2)
+        return formatStaged(args)
+
     if inputIdx is None:
         if len(args.files) > 1:
             stderr.write('error: must specify {} in formatter command for multiple files\n')
@@ -78,3 +88,37 @@ def main(argv):
         finally:
             if tmp is not None:
                 os.remove(tmp)
+
+def formatStaged(args):
+    """Reads staged blobs, formats them and produces patches against the index.
+    Only files with staged changes are formatted and only the parts of the
+    formatter output that touch staged lines are kept."""
+    try:
+        ranges = staged.stagedRanges(args.files)
+        prefix = staged.repoPrefix()
+        index = staged.IndexReader()
+        try:
+            for file in args.files:
+                fullname = staged.fullName(prefix, file)
+                if fullname not in ranges or len(ranges[fullname]) == 0:
+                    if args.verbose > 0:
+                        print('nothing staged in %s' % file)
+                    continue
+                contents = index.read(fullname)
+                if len(contents) > 0 and contents[-1] != '\n':
+                    stderr.write('warning: skipping %s, no newline at end of file\n' % file)
+                    continue
+                if args.verbose > 0:
+                    print('running formatter: [%s]' % ', '.join(args.formatter))
+                formatted, code = staged.runFormatter(args.formatter, contents)
+                if code != 0:
+                    # don't produce patches from partial or missing output
+                    stderr.write('Error running formatter on %s: %d\n' % (file, code))
+                    continue
+                diff = staged.diffContents(fullname, contents, formatted)
+                bridge.produceStagedPatches(diff, file, fullname, contents, ranges[fullname])
+        finally:
+            index.close()
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+        stderr.write('error formatting: %s\n' % e)
+        exit(1)
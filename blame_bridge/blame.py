@@ -1,5 +1,6 @@
 import sys
 import subprocess
+import os
 import time
 import calendar
 from datetime import datetime
@@ -48,6 +49,26 @@ defaultBlame = BlameData('newline', 0, 0, {
     'summary': 'Whitespace added by reformatter'
 })
 
+def stagedBlame():
+    """Blame for lines that are staged but not committed, which git blame
+    attributes to an all-zero commit.  These belong to whoever is committing."""
+    try:
+        ident = subprocess.check_output(['git', 'var', 'GIT_AUTHOR_IDENT'])[:-1]
+    except subprocess.CalledProcessError:
+        return defaultBlame
+    person, authorTime, tz = ident.rsplit(' ', 2)
+    author, _, mail = person.partition(' <')
+    return BlameData('staged', 0, 0, {
+        'author': author,
+        'author-mail': '<' + mail,
+        'author-time': authorTime,
+        'author-tz': tz,
+        'summary': 'Staged changes'
+    })
+
+def isUncommitted(blame):
+    return blame.id.strip('0') == ''
+
 def readCommitData(blameOutput, id):
     commitData = {}
     line = blameOutput.readline()
@@ -61,10 +82,12 @@ def readCommitData(blameOutput, id):
 def parseBlame(blameOutput):
     allCommits = {}
     previousCommit = None
+    lineStart = lineCount = 0
     line = blameOutput.readline()
     while line != '':
         commit, lineTmp  = line.split(' ')[0::2]
-        if commit != previousCommit:
+        # with -L, blame output can skip lines, so break there too
+        if commit != previousCommit or int(lineTmp) != lineStart + lineCount:
             if previousCommit is not None:
                 yield BlameData(previousCommit, lineStart,
                                 lineStart + lineCount, allCommits[previousCommit])
@@ -78,18 +101,26 @@ def parseBlame(blameOutput):
         else:
             allCommits[commit] = data
         line = blameOutput.readline()
+    if previousCommit is None:
+        return
     yield BlameData(commit, lineStart,
                     lineStart + lineCount, allCommits[commit])
 
 class BlameCursor:
     def __init__(self, generator):
         self.iterator = generator.__iter__()
-        self._next();
+        try:
+            self._next();
+        except StopIteration:
+            # nothing was blamed
+            self.current = None
 
     def _next(self):
         self.current = self.iterator.next()
 
     def getRange(self, start, end):
+        if self.current is None:
+            return
         if self.current.end > start:
             yield self.current
         while self.current.end <= start:
@@ -99,14 +130,35 @@ class BlameCursor:
             self._next()
             yield self.current
 
-def pipeBlame(filename):
-    blame = subprocess.Popen(['git', 'blame', '-p', filename],
-                             stdout=subprocess.PIPE, stderr=sys.stderr)
+def pipeBlame(filename, ranges=None, contents=None):
+    """Blame filename.  ranges is an optional list of (start, end) line
+    ranges, end exclusive, to limit blame to.  If contents is given, that is
+    blamed instead of the file in the working tree."""
+    command = ['git', 'blame', '-p']
+    if ranges is not None:
+        for start, end in ranges:
+            command += ['-L', '%d,%d' % (start, end - 1)]
+    if contents is not None:
+        command += ['--contents', '-']
+    command += ['--', filename]
+    blame = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=sys.stderr,
+                             stdin=None if contents is None else subprocess.PIPE)
+    if contents is not None:
+        blame.stdin.write(contents)
+        blame.stdin.close()
     for tuple in parseBlame(blame.stdout):
         yield tuple
+    if blame.wait() != 0:
+        raise RuntimeError('git blame failed for %s' % filename)
+
+def headExists():
+    """Whether there is a commit to blame against."""
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.call(['git', 'rev-parse', '--verify', '-q', 'HEAD'],
+                               stdout=devnull) == 0
 
-def blameCursor(filename):
-    return BlameCursor(pipeBlame(filename))
+def blameCursor(filename, ranges=None, contents=None):
+    return BlameCursor(pipeBlame(filename, ranges, contents))
 
 
 def pickNewest(blames):
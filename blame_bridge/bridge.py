@@ -4,7 +4,7 @@ from sys import stdout, stderr, argv
 from collections import deque
 
 from diffu import parseDiff, writeMergedChunks
-from blame import blameCursor, defaultBlame, mergeBlames, pickNewest
+from blame import blameCursor, headExists, stagedBlame, isUncommitted, defaultBlame, mergeBlames, pickNewest
 
 verbose = 0
 ignoreCharacters = ' \t\r\n'
@@ -100,12 +100,13 @@ def attemptToSplitDiffChunkByBlame(chunk, allBlames):
         pending += 1
     yield (chunk, previousBlame)
 
-def processDiff(diffOutput, filename):
-    blames = blameCursor(filename)
-    for chunk in parseDiff(diffOutput):
+def processChunks(chunks, blames):
+    for chunk in chunks:
         if chunk.original.count() > 0:
             chunkBlames = deque(blames.getRange(chunk.original.start, chunk.original.end))
-            if len(chunkBlames) == 1:
+            if len(chunkBlames) == 0:
+                yield (chunk, defaultBlame)
+            elif len(chunkBlames) == 1:
                 yield (chunk, chunkBlames.popleft())
             else:
                 # Now things get tricky
@@ -114,6 +115,32 @@ def processDiff(diffOutput, filename):
         else:
             yield (chunk, defaultBlame)
 
+def processDiff(diffOutput, filename):
+    return processChunks(parseDiff(diffOutput), blameCursor(filename))
+
+def touchesRanges(chunk, ranges):
+    start = chunk.original.start
+    end = max(chunk.original.end, start + 1)
+    for (rangeStart, rangeEnd) in ranges:
+        if start < rangeEnd and rangeStart < end:
+            return True
+    return False
+
+def processStagedDiff(diffOutput, filename, contents, stagedRanges):
+    """Like processDiff, but only keeps the chunks that touch the staged
+    ranges and only blames the lines those chunks replace.  contents is the
+    staged version of the file that the diff was made against.  Lines that
+    aren't committed yet are attributed to the current author."""
+    staged = stagedBlame()
+    chunks = [c for c in parseDiff(diffOutput) if touchesRanges(c, stagedRanges)]
+    blameRanges = [(c.original.start, c.original.end)
+                   for c in chunks if c.original.count() > 0]
+    if len(blameRanges) == 0 or not headExists():
+        # before the first commit everything is staged
+        return [(c, staged if c.original.count() > 0 else defaultBlame) for c in chunks]
+    blames = processChunks(chunks, blameCursor(filename, blameRanges, contents))
+    return [(c, staged if isUncommitted(b) else b) for c, b in blames]
+
 def collectChunks(blameId, all):
     """Looks through the list of chunks for ones that match the blameId it saves
     those.  For chunks that are not selected, it applies the diff for each of
@@ -169,8 +196,9 @@ def printChunks(chunks, patchFile):
     printSaved()
 
 
-def writePatches(blameGenerator, filename):
-    fullname = subprocess.check_output(['git', 'ls-files', '--full-name', filename])[:-1]
+def writePatches(blameGenerator, filename, fullname=None):
+    if fullname is None:
+        fullname = subprocess.check_output(['git', 'ls-files', '--full-name', filename])[:-1]
     counter = 0
     chunkCount = 0
     all = list(blameGenerator)
@@ -199,3 +227,7 @@ def writePatches(blameGenerator, filename):
 
 def producePatches(reformatted, filename):
     writePatches(processDiff(reformatted, filename), filename)
+
+def produceStagedPatches(reformatted, filename, fullname, contents, stagedRanges):
+    writePatches(processStagedDiff(reformatted, filename, contents, stagedRanges),
+                 filename, fullname)
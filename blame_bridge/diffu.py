@@ -144,8 +144,10 @@ def parseDiff(input):
     if line[:3] == '+++':
         line = input.readline()
 
-    headerRegex = re.compile(r'^@@ -(\d+),\d+ \+(\d+),\d+ @@')
+    headerRegex = re.compile(r'^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@')
     pendingChunks = deque()
+    original = []
+    changed = []
     while line != '':
         operation, remainder = line[0], line[1:]
         if operation == '@':
@@ -195,6 +197,11 @@ def parseDiff(input):
         line = input.readline()
     for chunk in pendingChunks:
         yield chunk
+    # a change at the end of the file has no trailing context
+    if len(original) > 0 or len(changed) > 0:
+        yield DiffChunk(DiffLines(originalLine, original),
+                        DiffLines(changedLine, changed),
+                        context)
 
 def writeMergedChunks(chunks, output):
     prev = None
@@ -0,0 +1,131 @@
+import subprocess
+import threading
+import os
+import re
+
+from StringIO import StringIO
+
+hunkRegex = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+def repoPrefix():
+    """The path of the current directory relative to the top of the repository."""
+    return subprocess.check_output(['git', 'rev-parse', '--show-prefix'])[:-1]
+
+def fullName(prefix, filename):
+    """The name of the file relative to the top of the repository, which is
+    what the index and the output of git diff use."""
+    return os.path.normpath(os.path.join(prefix, filename))
+
+def unquotePath(name):
+    """Undoes the quoting git diff applies to unusual file names."""
+    if name[-1:] == '\t':
+        # git adds a tab after names that contain spaces
+        name = name[:-1]
+    if name[:1] == '"' and name[-1:] == '"':
+        name = name[1:-1].decode('string_escape')
+    return name
+
+def stagedRanges(files):
+    """Runs a single git diff over the index and returns a dict that maps the
+    full name of each file to the line ranges that are staged in that file.
+    Ranges are (start, end) pairs of index line numbers, end exclusive.  A
+    staged deletion is recorded as the line preceding it, or the line that
+    follows it at the top of the file.  Files that have nothing staged don't
+    appear at all."""
+    diff = subprocess.Popen(['git', 'diff', '--cached', '-U0', '--no-color',
+                             '--no-ext-diff', '--no-renames', '--no-relative',
+                             '--src-prefix=a/', '--dst-prefix=b/', '--'] + files,
+                            stdout=subprocess.PIPE)
+    ranges = {}
+    current = None
+    # 'diff' after a diff --git line, '---' after its --- line, None in hunks;
+    # with -U0 an added line can look like a +++ line
+    header = None
+    for line in diff.stdout:
+        if line[:11] == 'diff --git ':
+            header = 'diff'
+            current = None
+        elif header == 'diff' and line[:4] == '--- ':
+            header = '---'
+        elif header == '---' and line[:4] == '+++ ':
+            header = None
+            name = unquotePath(line[4:-1])
+            if name[:2] == 'b/':
+                current = ranges.setdefault(name[2:], [])
+            # otherwise a deleted file, there's nothing to format
+        elif line[:2] == '@@' and current is not None:
+            header = None
+            m = hunkRegex.match(line)
+            if m is None:
+                raise RuntimeError('can\'t parse @@ line')
+            start = int(m.group(1))
+            count = 1 if m.group(2) is None else int(m.group(2))
+            if start == 0:
+                # deletion at the top of the file
+                current.append((1, 2))
+            else:
+                current.append((start, start + max(count, 1)))
+    if diff.wait() != 0:
+        raise RuntimeError('git diff --cached failed')
+    return ranges
+
+class IndexReader:
+    """Reads staged blobs through one long-running git cat-file --batch."""
+    def __init__(self):
+        self.process = subprocess.Popen(['git', 'cat-file', '--batch'],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE)
+
+    def read(self, fullname):
+        self.process.stdin.write(':%s\n' % fullname)
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise RuntimeError('%s is not in the index' % fullname)
+        contents = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1) # trailing newline
+        if header[1] != 'blob':
+            raise RuntimeError('%s is a %s, not a file' % (fullname, header[1]))
+        return contents
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+def runFormatter(command, contents):
+    """Feeds contents to the formatter on stdin and returns what it writes to
+    stdout, along with its exit code."""
+    formatter = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE)
+    formatted = formatter.communicate(contents)[0]
+    return formatted, formatter.returncode
+
+def diffContents(fullname, original, formatted):
+    """Runs diff -u -d over the two strings without going through the
+    filesystem.  The original goes to stdin and the formatted output through
+    a second pipe that diff opens as /dev/fd/N.  A missing newline at the end
+    of the formatted string is ignored, parseDiff doesn't understand the
+    marker diff adds for that."""
+    if len(formatted) > 0 and formatted[-1] != '\n':
+        formatted += '\n'
+    r, w = os.pipe()
+    try:
+        diff = subprocess.Popen(['diff', '-u', '-d', '-', '/dev/fd/%d' % r],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                preexec_fn=lambda: os.close(w))
+    except:
+        os.close(w)
+        raise
+    finally:
+        os.close(r)
+
+    def writeFormatted():
+        with os.fdopen(w, 'w') as output:
+            output.write(formatted)
+    # diff reads both inputs in whichever order it likes, so feed one of them
+    # from another thread
+    writer = threading.Thread(target=writeFormatted)
+    writer.start()
+    output = diff.communicate(original)[0]
+    writer.join()
+    return StringIO(output)